@@ -2,14 +2,35 @@
 FastAPI Main Application - Multi-Model Support
 """
 
+import asyncio
+import os
+
+# Cap BLAS/OpenMP thread pools before NumPy or TF are imported: with
+# three models running concurrently, the default of os.cpu_count()
+# threads each oversubscribes the box 3x and thrashes caches
+_THREADS_PER_MODEL = str(max(1, (os.cpu_count() or 1) // 3))
+os.environ.setdefault("OMP_NUM_THREADS", _THREADS_PER_MODEL)
+os.environ.setdefault("OPENBLAS_NUM_THREADS", _THREADS_PER_MODEL)
+
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse
-import os
 import uuid
-from backend.app.preprocessing import process_dicom
-from backend.app.inference import load_all_models, predict_all_models, load_model
+import cachetools
+import xxhash
+from backend.app.preprocessing import (
+    process_dicom,
+    save_original_image,
+    save_processed_image,
+)
+from backend.app.inference import (
+    load_all_models,
+    predict_all_models,
+    load_model,
+    build_fused_predictor,
+    warm_up_models,
+)
 import logging
 
 logging.basicConfig(
@@ -33,13 +54,19 @@ app.add_middleware(
 )
 
 # Create necessary directories
-os.makedirs("uploads", exist_ok=True)
 os.makedirs("outputs", exist_ok=True)
 app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
 
 # Global models dictionary
 models = {}
 
+# Response cache keyed on a hash of the uploaded DICOM bytes - identical
+# re-uploads (QA, demos, re-runs) skip preprocessing and inference entirely
+PRED_CACHE = cachetools.TTLCache(maxsize=512, ttl=3600)
+
+# Chunk size for streaming uploads through the hash
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 # Model configuration
 MODEL_PATHS = {
     "model_a": "models/eff2.keras",
@@ -85,6 +112,24 @@ async def startup_event():
             logger.info("✓ All three models loaded successfully - API ready")
         except Exception as e:
             logger.error(f"Failed to load models: {e}")
+            return
+
+    # Fuse the three Keras models into one compiled forward pass
+    # (no-op for ONNX sessions)
+    try:
+        fused = build_fused_predictor(models)
+        if fused is not None:
+            models["_fused"] = fused
+            logger.info("✓ Fused predictor ready")
+    except Exception as e:
+        logger.warning(f"Fused predictor unavailable: {e}")
+
+    # Warm every model so the first request skips the cold-start cost
+    try:
+        warm_up_models(models)
+        logger.info("✓ Models warmed up")
+    except Exception as e:
+        logger.warning(f"Model warm-up failed: {e}")
 
 
 @app.get("/", tags=["Root"])
@@ -112,7 +157,13 @@ async def health_check():
             "model_b": "model_b" in models and models["model_b"] is not None,
             "model_c": "model_c" in models and models["model_c"] is not None,
         },
-        "total_models": len([m for m in models.values() if m is not None]),
+        "total_models": len(
+            [
+                m
+                for k, m in models.items()
+                if not k.startswith("_") and m is not None
+            ]
+        ),
     }
 
 
@@ -135,31 +186,46 @@ async def predict_ich(file: UploadFile = File(...)):
             status_code=400, detail="Only DICOM files (.dcm) are accepted"
         )
 
+    # Hash the upload chunk-wise instead of buffering a full copy in RAM;
+    # Starlette spools the body to a temp file we can hand to pydicom
+    hasher = xxhash.xxh3_64()
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        hasher.update(chunk)
+        size += len(chunk)
+    await file.seek(0)
+
+    # Identical uploads return the cached response without re-running
+    # preprocessing or inference
+    cache_key = hasher.hexdigest()
+    cached = PRED_CACHE.get(cache_key)
+    if cached is not None:
+        logger.info(f"Cache hit: file={file.filename}, key={cache_key}")
+        return JSONResponse(content=cached)
+
     file_id = str(uuid.uuid4())
-    dicom_path = f"uploads/{file_id}.dcm"
 
-    logger.info(f"Processing request: file={file.filename}, id={file_id}")
+    logger.info(
+        f"Processing request: file={file.filename}, id={file_id}, "
+        f"size={size} bytes"
+    )
 
     try:
-        # Save uploaded file
-        with open(dicom_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-
-        logger.info(f"File saved: {dicom_path} ({len(content)} bytes)")
-
-        # Process DICOM (unchanged preprocessing pipeline)
-        original_img, processed_img, rgb_array = process_dicom(
-            dicom_path=dicom_path, output_dir="outputs", file_id=file_id
+        # Parse DICOM straight from the spooled upload - no disk
+        # round-trip and no second in-memory copy
+        pixel_array, rgb_array = await asyncio.to_thread(process_dicom, file.file)
+
+        original_path = os.path.join("outputs", f"{file_id}_original.png")
+        processed_path = os.path.join("outputs", f"{file_id}_processed.png")
+
+        # PNG encoding and inference are independent - run them
+        # concurrently off the event loop
+        predictions, _, _ = await asyncio.gather(
+            asyncio.to_thread(predict_all_models, models, rgb_array),
+            asyncio.to_thread(save_original_image, pixel_array, original_path),
+            asyncio.to_thread(save_processed_image, rgb_array, processed_path),
         )
 
-        # Run inference on all models
-        predictions = predict_all_models(models, rgb_array)
-
-        # Clean up uploaded file
-        os.remove(dicom_path)
-        logger.info(f"Cleaned up: {dicom_path}")
-
         # Prepare response
         response = {
             "file_id": file_id,
@@ -174,6 +240,8 @@ async def predict_ich(file: UploadFile = File(...)):
             },
         }
 
+        PRED_CACHE[cache_key] = response
+
         logger.info(f"Request complete: Multi-model predictions generated")
 
         return JSONResponse(content=response)
@@ -181,9 +249,6 @@ async def predict_ich(file: UploadFile = File(...)):
     except Exception as e:
         logger.error(f"Error processing request: {e}", exc_info=True)
 
-        if os.path.exists(dicom_path):
-            os.remove(dicom_path)
-
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
 
 
